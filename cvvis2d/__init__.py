@@ -1,6 +1,7 @@
 #__all__ = ['detection', 'image', 'text']
 # The core visualization pipeline
 from cvvis2d.pipeline import VisualizationPipeline
+from cvvis2d.buffers import BufferPool
 
 # Load version
 import os
@@ -14,3 +15,6 @@ from cvvis2d.image import ImageOverlay
 
 from cvvis2d.detection import BoundingBox2d, BoundingBox2dOverlay, create_bounding_box
 from cvvis2d.pinhole import CameraPoseOverlay, TagPoseOverlay
+from cvvis2d.pose import SkeletonOverlay, COCO_SKELETON
+from cvvis2d.recording import ArgsRecorder, ArgsReplay
+from cvvis2d.streaming import MJPEGStreamSink
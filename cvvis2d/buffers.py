@@ -0,0 +1,144 @@
+from typing import Dict, Tuple
+import collections
+import logging
+import threading
+import weakref
+import numpy as np
+
+
+# Transient allocations are reported every this many times, as they
+# indicate that results are not released
+_TRANSIENT_WARNING_INTERVAL = 100
+
+
+class BufferPool(object):
+    """
+    Keeps a small ring of preallocated arrays per shape (*i.e.* resolution)
+    and hands them out for reuse.
+
+    Buffers obtained via :meth:`acquire` are owned by the caller until they
+    are returned via :meth:`release`. If all pooled buffers of the requested
+    shape are currently in use, a transient buffer will be allocated, which
+    will *not* be retained upon release. The pool only keeps weak references
+    to such transient buffers, *i.e.* they are freed as usual if the caller
+    drops them without releasing. Thus, the memory footprint of the pool is
+    bounded by ``capacity`` buffers per resolution. Pooled buffers which are
+    never released cannot be reused, so each further request has to
+    allocate a transient buffer. This is logged as warning for the first
+    and then every 100th transient allocation.
+
+    Args:
+      capacity: Maximum number of buffers which will be kept per shape.
+      dtype: Data type of the buffers.
+    """
+    def __init__(self, capacity: int = 3, dtype: np.dtype = np.uint8):
+        if capacity < 1:
+            raise ValueError(
+                f'Buffer pool capacity must be > 0, but got {capacity}.')
+        self._capacity = capacity
+        self._dtype = np.dtype(dtype)
+        # Available buffers per shape
+        self._free = collections.defaultdict(collections.deque)
+        # Number of pooled (not transient) buffers per shape
+        self._num_pooled = collections.defaultdict(int)
+        # Pooled buffers currently handed out, mapping id(buffer) to buffer
+        self._in_use = dict()
+        # Transient buffers currently handed out (weakly referenced)
+        self._transient = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        # Statistics
+        self._num_allocations = 0
+        self._num_reuses = 0
+        self._num_transient = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def acquire(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """
+        Returns an (uninitialized) buffer of the given shape. The caller must
+        return it via :meth:`release` once it is no longer needed.
+        """
+        shape = tuple(shape)
+        with self._lock:
+            free = self._free[shape]
+            if len(free) > 0:
+                buffer = free.popleft()
+                self._num_reuses += 1
+                self._in_use[id(buffer)] = buffer
+                return buffer
+
+            buffer = np.empty(shape, dtype=self._dtype)
+            self._num_allocations += 1
+            if self._num_pooled[shape] < self._capacity:
+                self._num_pooled[shape] += 1
+                self._in_use[id(buffer)] = buffer
+                return buffer
+
+            self._num_transient += 1
+            self._transient[id(buffer)] = buffer
+            if (self._num_transient - 1) % _TRANSIENT_WARNING_INTERVAL == 0:
+                logging.warning(
+                    f'All {self._capacity} pooled buffers of shape {shape} are '
+                    'in use, allocating transient buffers instead - check '
+                    'that the results are released (transient allocations '
+                    f'so far: {self._num_transient}).')
+        return buffer
+
+    def _lookup(self, buffer: np.ndarray) -> Tuple[int, bool]:
+        # Views (e.g. `vis[:, :, ::-1]`) are resolved via their base arrays
+        while isinstance(buffer, np.ndarray):
+            key = id(buffer)
+            if key in self._in_use:
+                return key, True
+            if key in self._transient:
+                return key, False
+            buffer = buffer.base
+        return None, False
+
+    def release(self, buffer: np.ndarray) -> None:
+        """
+        Returns a buffer (previously obtained via :meth:`acquire`) to the pool.
+        A view of an acquired buffer can be passed instead, which releases
+        the underlying buffer.
+        """
+        with self._lock:
+            key, is_pooled = self._lookup(buffer)
+            if key is None:
+                raise ValueError(
+                    'Cannot release a buffer which has not been acquired from '
+                    'this pool (or which has already been released).')
+            if is_pooled:
+                pooled_buffer = self._in_use.pop(key)
+                self._free[pooled_buffer.shape].append(pooled_buffer)
+            else:
+                del self._transient[key]
+
+    def clear(self) -> None:
+        """
+        Drops all currently available buffers. Buffers which are still in use
+        can be released later on, but will not be retained.
+        """
+        with self._lock:
+            self._free.clear()
+            self._num_pooled.clear()
+            for key, buffer in self._in_use.items():
+                self._transient[key] = buffer
+            self._in_use.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the pool statistics, *i.e.* the total number of allocations,
+        reuses & transient (overflow) allocations, as well as the number of
+        buffers currently in use/available and the number of distinct shapes.
+        """
+        with self._lock:
+            return {
+                'allocations': self._num_allocations,
+                'reuses': self._num_reuses,
+                'transient': self._num_transient,
+                'in_use': len(self._in_use) + len(self._transient),
+                'available': sum(len(f) for f in self._free.values()),
+                'resolutions': sum(1 for n in self._num_pooled.values() if n > 0)
+            }
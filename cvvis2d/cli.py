@@ -0,0 +1,160 @@
+from typing import Iterator, List, Tuple, Union
+import argparse
+import collections
+import concurrent.futures
+import logging
+import os
+import numpy as np
+import viren2d
+from cvvis2d.pipeline import VisualizationPipeline
+from cvvis2d.text import DynamicTextOverlay, frame_label
+from cvvis2d.detection import BoundingBox2dOverlay
+from cvvis2d.detection_io import DetectionFileIndex
+
+
+_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tga', '.pgm', '.ppm')
+
+# Per-process state of the rendering workers, see `_init_worker`
+_worker_state = dict()
+
+
+def _init_worker(
+        detections: DetectionFileIndex, label: str, output_dir: str,
+        extension: str) -> None:
+    pipeline = VisualizationPipeline()
+    pipeline.add('bbox2d', BoundingBox2dOverlay())
+    pipeline.add('frame-label', DynamicTextOverlay())
+    _worker_state.update(
+        pipeline=pipeline, detections=detections, label=label,
+        output_dir=output_dir, extension=extension)
+
+
+def _render_frame(frame_number: int, image: Union[str, np.ndarray]) -> str:
+    if isinstance(image, str):
+        image = viren2d.load_image_uint8(image)
+    args = {
+        'bbox2d': _worker_state['detections'].load(frame_number),
+        'frame-label': frame_label(_worker_state['label'], frame_number)}
+    vis = _worker_state['pipeline'].visualize(image, args)
+    output_filename = os.path.join(
+        _worker_state['output_dir'],
+        f'{frame_number:06d}{_worker_state["extension"]}')
+    viren2d.save_image_uint8(output_filename, np.ascontiguousarray(vis))
+    return output_filename
+
+
+def _image_frames(
+        directory: str,
+        first_frame: int) -> Iterator[Tuple[int, Union[str, np.ndarray]]]:
+    # Images are loaded by the workers, so we only need to pass the paths
+    filenames = sorted(
+        fn for fn in os.listdir(directory)
+        if os.path.splitext(fn)[1].lower() in _IMAGE_EXTENSIONS)
+    for idx, fn in enumerate(filenames):
+        yield first_frame + idx, os.path.join(directory, fn)
+
+
+def _video_frames(
+        filename: str,
+        first_frame: int) -> Iterator[Tuple[int, Union[str, np.ndarray]]]:
+    try:
+        import cv2
+    except ImportError:
+        raise RuntimeError(
+            'Rendering videos requires OpenCV, install it via '
+            '`pip install opencv-python`.') from None
+    capture = cv2.VideoCapture(filename)
+    if not capture.isOpened():
+        raise IOError(f'Cannot open video "{filename}".')
+    frame_number = first_frame
+    try:
+        while True:
+            retval, frame = capture.read()
+            if not retval:
+                break
+            # Convert from OpenCV BGR to RGB (used by viren2d)
+            yield frame_number, np.ascontiguousarray(frame[:, :, ::-1])
+            frame_number += 1
+    finally:
+        capture.release()
+
+
+def _parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='cvvis2d',
+        description='Renders bounding boxes from a MOT/COCO-style detection '
+        'file onto a directory of images or a video.')
+    parser.add_argument(
+        'input', help='Directory of images (sorted by filename) or a video.')
+    parser.add_argument(
+        'output_dir', help='Directory to store the rendered frames.')
+    parser.add_argument(
+        '-d', '--detections', required=True, help='Detection file.')
+    parser.add_argument(
+        '-f', '--format', choices=['mot', 'coco'], default=None,
+        help='Detection file format. Defaults to "coco" for *.json '
+        'files, "mot" otherwise.')
+    parser.add_argument(
+        '--first-frame', type=int, default=1,
+        help='Frame number of the first image/video frame (default: %(default)d, '
+        'as in MOTChallenge). For COCO files, detections are matched by '
+        'image_id.')
+    parser.add_argument(
+        '--min-score', type=float, default=None,
+        help='Skip detections with a lower confidence.')
+    parser.add_argument(
+        '--label', default='Frame',
+        help='Text to prepend to the frame number (default: %(default)s).')
+    parser.add_argument(
+        '-j', '--workers', type=int, default=os.cpu_count(),
+        help='Number of rendering processes (default: %(default)s).')
+    parser.add_argument(
+        '--extension', default='.jpg',
+        help='File extension of the rendered frames (default: %(default)s).')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    """Entry point of the ``cvvis2d`` command line renderer."""
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    args = _parse_args(argv)
+
+    file_format = args.format
+    if file_format is None:
+        file_format = 'coco' if args.detections.lower().endswith('.json') else 'mot'
+    detections = DetectionFileIndex(
+        args.detections, file_format, min_score=args.min_score)
+    logging.info(
+        f'Indexed detections for {len(detections)} frames from '
+        f'"{args.detections}".')
+
+    if os.path.isdir(args.input):
+        frames = _image_frames(args.input, args.first_frame)
+    else:
+        frames = _video_frames(args.input, args.first_frame)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    num_workers = max(1, args.workers)
+    # Limit the number of pending frames, as decoded video frames have to be
+    # kept in memory until they are rendered.
+    max_pending = 2 * num_workers
+    pending = collections.deque()
+    num_rendered = 0
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_workers, initializer=_init_worker,
+            initargs=(detections, args.label, args.output_dir,
+                      args.extension)) as executor:
+        for frame_number, image in frames:
+            if len(pending) >= max_pending:
+                pending.popleft().result()
+                num_rendered += 1
+            pending.append(executor.submit(_render_frame, frame_number, image))
+        while pending:
+            pending.popleft().result()
+            num_rendered += 1
+    logging.info(f'Rendered {num_rendered} frames to "{args.output_dir}".')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
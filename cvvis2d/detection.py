@@ -1,6 +1,7 @@
 # import numpy as np
 import viren2d
 from cvvis2d.utils import compute_absolute_padding
+from cvvis2d.labels import place_labels
 from typing import List, Tuple, Union
 
 
@@ -40,6 +41,14 @@ class BoundingBox2d(object):
     def color(self):
         return self._color
 
+    @property
+    def left(self):
+        return self._left
+
+    @property
+    def top(self):
+        return self._top
+
     @property
     def width(self):
         return self._width
@@ -100,6 +109,16 @@ class BoundingBox2dOverlay(object):
 
     TODO doc parametrization
     TODO label padding can be specified relative (w.r.t. bounding box dimension)
+
+    If `avoid_label_overlap` is set, labels will be moved to a free slot of
+    their box (or suppressed) instead of being drawn on top of the labels
+    of other boxes, see :func:`cvvis2d.labels.place_labels`. Earlier boxes
+    take precedence, so sort the detections accordingly (*e.g.* by score).
+    As viren2d cannot measure text without drawing it, the label sizes are
+    estimated from the number of characters and the font size (assuming
+    glyphs of about 0.6 times the font size). Labels drawn with wider fonts
+    may thus still overlap. This option requires left-aligned labels, *i.e.*
+    `text_style.halign` must be left.
     """
     def __init__(self):
         self.text_style = viren2d.TextStyle(
@@ -114,6 +133,7 @@ class BoundingBox2dOverlay(object):
         self.clip_label = False
         self.label_left_t2b = False
         self.label_right_t2b = True
+        self.avoid_label_overlap = False
 
     def apply(
             self, painter: viren2d.Painter,
@@ -125,16 +145,30 @@ class BoundingBox2dOverlay(object):
             label_padding=self.label_padding,
             clip_label=self.clip_label)
 
+        paddings = [
+            compute_absolute_padding(self.label_padding, box.width, box.height)
+            for box in detections]
+        if self.avoid_label_overlap:
+            labels = place_labels(
+                detections, self.text_style, paddings, self.clip_label,
+                self.label_left_t2b, self.label_right_t2b)
+        else:
+            labels = [{
+                'top': box.label_top, 'bottom': box.label_bottom,
+                'left': box.label_left, 'right': box.label_right}
+                for box in detections]
+
         success = True
-        for box in detections:
-            box_style.label_padding = compute_absolute_padding(
-                self.label_padding, box.width, box.height)
+        for box, padding, label in zip(detections, paddings, labels):
+            box_style.label_padding = padding
             box_style.line_style.color = box.color
             res = painter.draw_bounding_box_2d(
                 rect=box.to_rect(self.corner_radius), box_style=box_style,
-                label_top=box.label_top, label_bottom=box.label_bottom,
-                label_left=box.label_left, left_t2b=self.label_left_t2b,
-                label_right=box.label_right, right_t2b=self.label_right_t2b)
+                label_top=label.get('top', []),
+                label_bottom=label.get('bottom', []),
+                label_left=label.get('left', []), left_t2b=self.label_left_t2b,
+                label_right=label.get('right', []),
+                right_t2b=self.label_right_t2b)
             success = success and res
 
         return success
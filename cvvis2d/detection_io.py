@@ -0,0 +1,230 @@
+from typing import Iterable, Iterator, List, Tuple
+import json
+import logging
+import re
+import viren2d
+from cvvis2d.detection import BoundingBox2d, create_bounding_box
+
+
+# Structural characters of a JSON document, and the remainder of a string
+# literal (after its opening quote)
+_JSON_TOKEN = re.compile(rb'[{}\[\]"]')
+_JSON_STRING_END = re.compile(rb'(?:[^"\\]|\\.)*"', re.DOTALL)
+
+
+def _iter_json_array_objects(
+        chunks: Iterable[bytes], filename: str,
+        depth: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """
+    Incrementally scans a JSON document and yields ``tuple(offset, data)``
+    for each object which is an element of the top-level array, *i.e.* its
+    byte offset and raw content. Nested objects are skipped as part of their
+    parent and braces within strings are ignored.
+
+    Args:
+      chunks: The document, split into arbitrary chunks.
+      filename: Used for error messages.
+      depth: Nesting depth at the start of the data, *e.g.* 1 to scan a
+        sequence of objects without the enclosing array brackets.
+    """
+    # File offset of the first byte in `buffer`
+    offset = 0
+    buffer = b''
+    pos = 0
+    object_start = None
+    for chunk in chunks:
+        buffer += chunk
+        while True:
+            token = _JSON_TOKEN.search(buffer, pos)
+            if token is None:
+                pos = len(buffer)
+                break
+            char = token.group(0)
+            if char == b'"':
+                string_end = _JSON_STRING_END.match(buffer, token.end())
+                if string_end is None:
+                    # Incomplete string, wait for the next chunk
+                    pos = token.start()
+                    break
+                pos = string_end.end()
+                continue
+
+            pos = token.end()
+            if char in b'{[':
+                if (depth == 0) and (char == b'{'):
+                    raise ValueError(
+                        f'"{filename}" is not a COCO results file, which must '
+                        'hold a list of detections.')
+                depth += 1
+                if (depth == 2) and (char == b'{'):
+                    object_start = token.start()
+            else:
+                depth -= 1
+                if (depth == 1) and (char == b'}'):
+                    yield offset + object_start, buffer[object_start:pos]
+                    object_start = None
+        # Drop the processed data (except for an incomplete object)
+        keep = pos if object_start is None else object_start
+        offset += keep
+        buffer = buffer[keep:]
+        pos -= keep
+        if object_start is not None:
+            object_start = 0
+
+
+class DetectionFileIndex(object):
+    """
+    Provides per-frame access to the bounding boxes stored in a (potentially
+    very large) detection file.
+
+    Upon construction, the file is scanned once to build an index which maps
+    each frame number to the byte ranges holding its detections. The
+    detections themselves are only parsed when requested via :meth:`load`.
+    The index is picklable, so it can be shared with worker processes.
+
+    Supported formats:
+
+    * ``mot``: MOTChallenge CSV, *i.e.* one detection per line as
+      ``frame, id, left, top, width, height, conf[, ...]``. Boxes will be
+      labeled by their track id (if >= 0).
+    * ``coco``: COCO results JSON, *i.e.* a list of detections as
+      ``{"image_id": int, "category_id": int, "bbox": [x, y, w, h],
+      "score": float}``. The ``image_id`` is used as frame number. Additional
+      (nested) fields, *e.g.* ``segmentation``, are ignored.
+
+    Args:
+      filename: Path to the detection file.
+      file_format: Either ``'mot'`` or ``'coco'``.
+      min_score: Detections with a lower confidence will be skipped.
+      chunk_size: Number of bytes to read at once while indexing.
+    """
+    def __init__(
+            self, filename: str, file_format: str, min_score: float = None,
+            chunk_size: int = 1 << 22):
+        file_format = file_format.lower()
+        if file_format not in ('mot', 'coco'):
+            raise ValueError(
+                f'Unsupported detection file format "{file_format}".')
+        self.filename = filename
+        self.file_format = file_format
+        self.min_score = min_score
+        # Maps frame number to a list of tuple(start, end) byte ranges
+        self._spans = dict()
+        if file_format == 'mot':
+            self._index_mot()
+        else:
+            self._index_coco(chunk_size)
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def __contains__(self, frame_number: int) -> bool:
+        return frame_number in self._spans
+
+    @property
+    def frame_numbers(self) -> List[int]:
+        """Sorted frame numbers which have at least one detection."""
+        return sorted(self._spans.keys())
+
+    def _add_span(self, frame_number: int, start: int, end: int,
+                  previous_frame: int) -> None:
+        # Consecutive entries of the same frame are merged into a single range
+        spans = self._spans.setdefault(frame_number, list())
+        if (frame_number == previous_frame) and (len(spans) > 0):
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+
+    def _index_mot(self) -> None:
+        previous_frame = None
+        offset = 0
+        skipped = list()
+        with open(self.filename, 'rb') as f:
+            for line_number, line in enumerate(f, start=1):
+                start = offset
+                offset += len(line)
+                token = line.split(b',', 1)[0].strip()
+                if not token or token.startswith(b'#'):
+                    continue
+                try:
+                    frame_number = int(float(token))
+                except ValueError:
+                    # E.g. a header line
+                    skipped.append(line_number)
+                    previous_frame = None
+                    continue
+                self._add_span(frame_number, start, offset, previous_frame)
+                previous_frame = frame_number
+        if len(skipped) > 0:
+            logging.warning(
+                f'Skipped {len(skipped)} line(s) without a valid frame number '
+                f'in "{self.filename}", first one at line {skipped[0]}.')
+
+    def _index_coco(self, chunk_size: int) -> None:
+        previous_frame = None
+        num_skipped = 0
+        with open(self.filename, 'rb') as f:
+            chunks = iter(lambda: f.read(chunk_size), b'')
+            for offset, data in _iter_json_array_objects(chunks, self.filename):
+                image_id = json.loads(data).get('image_id')
+                if not isinstance(image_id, int):
+                    num_skipped += 1
+                    previous_frame = None
+                    continue
+                self._add_span(
+                    image_id, offset, offset + len(data), previous_frame)
+                previous_frame = image_id
+        if num_skipped > 0:
+            logging.warning(
+                f'Skipped {num_skipped} detection(s) without a valid '
+                f'"image_id" in "{self.filename}".')
+
+    def _read_spans(self, frame_number: int) -> Iterator[bytes]:
+        with open(self.filename, 'rb') as f:
+            for start, end in self._spans.get(frame_number, list()):
+                f.seek(start)
+                yield f.read(end - start)
+
+    def _parse_mot(self, frame_number: int) -> Iterator[Tuple[BoundingBox2d, float]]:
+        for data in self._read_spans(frame_number):
+            for line in data.splitlines():
+                values = line.split(b',')
+                if len(values) < 6:
+                    continue
+                try:
+                    track_id = int(float(values[1]))
+                    left, top, width, height = [float(v) for v in values[2:6]]
+                    score = float(values[6]) if len(values) > 6 else 1.0
+                except ValueError:
+                    continue
+                if track_id >= 0:
+                    box = BoundingBox2d.from_ltwh(
+                        left, top, width, height,
+                        viren2d.Color.from_object_id(track_id),
+                        label_top=f'ID {track_id}',
+                        label_bottom=f'C: {score:.2f}')
+                else:
+                    box = create_bounding_box(
+                        'person', left, top, width, height, score)
+                yield box, score
+
+    def _parse_coco(self, frame_number: int) -> Iterator[Tuple[BoundingBox2d, float]]:
+        for data in self._read_spans(frame_number):
+            # Spans hold a sequence of objects without the enclosing array
+            for _, obj in _iter_json_array_objects([data], self.filename, depth=1):
+                det = json.loads(obj)
+                if det.get('image_id') != frame_number:
+                    continue
+                score = float(det.get('score', 1.0))
+                yield create_bounding_box(
+                    det['category_id'], *det['bbox'], score), score
+
+    def load(self, frame_number: int) -> List[BoundingBox2d]:
+        """Returns the bounding boxes of the given frame."""
+        if self.file_format == 'mot':
+            detections = self._parse_mot(frame_number)
+        else:
+            detections = self._parse_coco(frame_number)
+        return [
+            box for box, score in detections
+            if (self.min_score is None) or (score >= self.min_score)]
@@ -0,0 +1,170 @@
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
+import viren2d
+
+if TYPE_CHECKING:
+    # Only needed for annotations, as the detection module imports this one
+    from cvvis2d.detection import BoundingBox2d
+
+
+# Label slots of a bounding box, in the order they will be tried
+_SLOTS = ('top', 'bottom', 'left', 'right')
+
+# Rough average glyph width w.r.t. the font size, used to estimate the text
+# extent without having to render it (viren2d does not provide text metrics
+# without drawing). This matches common sans-serif and monospace fonts.
+_GLYPH_WIDTH_FACTOR = 0.6
+# Bold glyphs are slightly wider
+_BOLD_WIDTH_FACTOR = 1.1
+
+
+class LabelGrid(object):
+    """
+    Uniform grid to efficiently check whether an axis-aligned rectangle
+    overlaps any of the previously inserted rectangles.
+
+    Rectangles are given as ``tuple(left, top, right, bottom)``. Each
+    rectangle is stored in all cells it covers, thus a query only needs to
+    check the rectangles within the same cells instead of all of them.
+
+    Args:
+      cell_size: Width & height of a grid cell, should be roughly the size
+        of a typical label.
+    """
+    def __init__(self, cell_size: float):
+        self._cell_size = max(1.0, float(cell_size))
+        self._cells = dict()
+
+    def _cell_range(self, rect: Tuple[float, float, float, float]):
+        cs = self._cell_size
+        return (
+            range(int(rect[0] // cs), int(rect[2] // cs) + 1),
+            range(int(rect[1] // cs), int(rect[3] // cs) + 1))
+
+    def overlaps(self, rect: Tuple[float, float, float, float]) -> bool:
+        cols, rows = self._cell_range(rect)
+        for cx in cols:
+            for cy in rows:
+                for other in self._cells.get((cx, cy), ()):
+                    if (rect[0] < other[2]) and (other[0] < rect[2]) and \
+                            (rect[1] < other[3]) and (other[1] < rect[3]):
+                        return True
+        return False
+
+    def insert(self, rect: Tuple[float, float, float, float]) -> None:
+        cols, rows = self._cell_range(rect)
+        for cx in cols:
+            for cy in rows:
+                self._cells.setdefault((cx, cy), list()).append(rect)
+
+
+def estimate_label_extent(
+        lines: List[str], text_style: viren2d.TextStyle,
+        padding: viren2d.Vec2d) -> Tuple[float, float]:
+    """
+    Returns the approximate ``tuple(length, thickness)`` of a (horizontally
+    drawn) multi-line label, *i.e.* its width and height including padding.
+
+    The width is estimated from the number of characters and the font size,
+    *i.e.* it assumes an average glyph width of about 0.6 times the font
+    size (slightly more for bold text). Fonts with wider glyphs will thus
+    be underestimated.
+    """
+    glyph_width = text_style.size * _GLYPH_WIDTH_FACTOR
+    if text_style.bold:
+        glyph_width *= _BOLD_WIDTH_FACTOR
+    length = max(len(line) for line in lines) * glyph_width
+    thickness = len(lines) * text_style.size * text_style.line_spacing
+    return length + 2 * padding[0], thickness + 2 * padding[1]
+
+
+def _slot_rect(
+        box: 'BoundingBox2d', slot: str, extent: Tuple[float, float],
+        clip_label: bool, left_t2b: bool,
+        right_t2b: bool) -> Tuple[float, float, float, float]:
+    # Labels are drawn (left-aligned) inside the box along the given edge,
+    # i.e. left & right labels are rotated.
+    length, thickness = extent
+    left, top = box.left, box.top
+    right, bottom = left + box.width, top + box.height
+    if slot in ('top', 'bottom'):
+        if clip_label:
+            length = min(length, box.width)
+        if slot == 'top':
+            return (left, top, left + length, top + thickness)
+        return (left, bottom - thickness, left + length, bottom)
+
+    if clip_label:
+        length = min(length, box.height)
+    t2b = left_t2b if slot == 'left' else right_t2b
+    y0, y1 = (top, top + length) if t2b else (bottom - length, bottom)
+    if slot == 'left':
+        return (left, y0, left + thickness, y1)
+    return (right - thickness, y0, right, y1)
+
+
+def place_labels(
+        boxes: Sequence['BoundingBox2d'], text_style: viren2d.TextStyle,
+        paddings: Sequence[viren2d.Vec2d], clip_label: bool = False,
+        left_t2b: bool = False,
+        right_t2b: bool = True) -> List[Dict[str, List[str]]]:
+    """
+    Assigns the labels of the given bounding boxes to the box slots (top,
+    bottom, left or right edge), such that labels of different boxes do not
+    overlap.
+
+    Boxes are processed in the given order, *i.e.* earlier boxes take
+    precedence. Each label is placed at its requested slot if possible,
+    otherwise at the first free alternative slot of its box. If all slots
+    would overlap previously placed labels, the label will be suppressed.
+    The extent of a label is estimated from its text style (see
+    :func:`estimate_label_extent`), and overlap checks are performed via a
+    :class:`LabelGrid`, so placement time grows (roughly) linearly with the
+    number of boxes. Labels are assumed to be left-aligned, *i.e.* a
+    `ValueError` is raised for any other horizontal alignment of the
+    text style.
+
+    Returns a list holding a dictionary (mapping slot name to label lines)
+    for each box.
+
+    Args:
+      boxes: The bounding boxes.
+      text_style: Text style used to render the labels.
+      paddings: Absolute label padding of each box.
+      clip_label: Whether labels will be clipped to the box size.
+      left_t2b: Whether the left label will be drawn top-to-bottom.
+      right_t2b: Whether the right label will be drawn top-to-bottom.
+    """
+    if text_style.halign != viren2d.HorizontalAlignment.Left:
+        raise ValueError(
+            'Label placement requires left-aligned labels, but text style '
+            f'uses {text_style.halign}.')
+
+    grid = LabelGrid(2 * text_style.size * text_style.line_spacing)
+    placements = list()
+    for box, padding in zip(boxes, paddings):
+        requested = [
+            (slot, getattr(box, f'label_{slot}')) for slot in _SLOTS]
+        requested = [(slot, lines) for slot, lines in requested if len(lines) > 0]
+        available = [s for s in _SLOTS if s not in {r[0] for r in requested}]
+
+        placed = dict()
+        rects = list()
+        for slot, lines in requested:
+            extent = estimate_label_extent(lines, text_style, padding)
+            for candidate in [slot] + available:
+                if candidate in placed:
+                    continue
+                rect = _slot_rect(
+                    box, candidate, extent, clip_label, left_t2b, right_t2b)
+                if not grid.overlaps(rect):
+                    placed[candidate] = lines
+                    rects.append(rect)
+                    if candidate != slot:
+                        available.remove(candidate)
+                    break
+        # Labels of the same box may touch each other, so they are only
+        # inserted once the box is done.
+        for rect in rects:
+            grid.insert(rect)
+        placements.append(placed)
+    return placements
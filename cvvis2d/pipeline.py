@@ -1,7 +1,10 @@
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, List
+import contextlib
+import time
 import numpy as np
 import viren2d
 import logging
+from cvvis2d.buffers import BufferPool
 
 #TODO remove debug timings
 from vito import pyutils
@@ -25,19 +28,79 @@ class VisualizationPipeline(object):
     >>>     image = load_next_image()
     >>>     vis = visualizer.visualize(image, {'frame-label': 'Some text'})
 
+    For long-running streams, the pipeline can reuse its output arrays
+    instead of allocating a new result for each frame. Enable this by
+    passing ``buffer_pool_size > 0`` and hand the results back once you
+    are done with them:
+
+    >>> visualizer = VisualizationPipeline(buffer_pool_size=2)
+    >>> with visualizer.rendered(image, {'frame-label': 'Some text'}) as vis:
+    >>>     display(vis)
+
+    Independent of the buffer pool, the painter's canvas is reused as long
+    as the resolution does not change, *i.e.* RGB images (``uint8``) are
+    copied into the existing canvas. Other inputs (*e.g.* grayscale or RGBA
+    images) are passed on to viren2d, which sets up a new canvas for each
+    frame.
+
+    Args:
+      buffer_pool_size: If > 0, results of `visualize` will be taken from
+        a pool holding (up to) this number of preallocated arrays per
+        resolution. Each result must then be returned via `release` (or
+        obtained via the `rendered` context manager instead).
+      frame_budget_ms: If set, the pipeline tries to finish each frame
+        within this time budget (in milliseconds). Based on the measured
+        run times of previous frames, lower-priority visualizers (see
+        `add`) will be skipped (shed) if they would exceed the budget. If
+        a shed visualizer renders onto its own layer (see `add`), its
+        previous layer will be drawn instead. A shed visualizer is retried
+        once a frame leaves enough slack to cover its estimated run time.
+        The shed visualizers of the most recent frame are reported by
+        `shed_visualizers`. Run time estimates are reset whenever the
+        resolution changes.
+      shed_retry_interval: A visualizer which has been shed for this number
+        of consecutive frames will be applied once more (regardless of the
+        budget) to re-measure its run time. Otherwise, a single slow frame
+        (*e.g.* due to loading fonts upon the first text rendering) could
+        disable a visualizer for good.
+
     #TODO add tracking-by-detection or camera geometry/calibration example
 
     #FIXME remove timing code before release
     """
-    def __init__(self):
+    def __init__(
+            self, buffer_pool_size: int = 0, frame_budget_ms: float = None,
+            shed_retry_interval: int = 30):
         # The painter will be passed on to each visualizer
         self._painter = viren2d.Painter()
         # Registered visualizers as list of tuple(identifier, visualizer)
         self._visualizers = list()
         # Used to check for unique identifiers
         self._identifiers = set()
+        # Optional pool of reusable output arrays
+        self._buffer_pool = None if buffer_pool_size <= 0 else BufferPool(
+            capacity=buffer_pool_size, dtype=np.uint8)
+        # Separate layers (i.e. painters) of the visualizers which cache
+        # their rendering results
+        self._layer_painters = dict()
+        # Canvas size (width, height) of the most recent layer per visualizer
+        self._layer_sizes = dict()
+        # Frame-time budgeting
+        self.frame_budget_ms = frame_budget_ms
+        self._priorities = dict()
+        # Exponential moving average of the run time (in seconds) per visualizer
+        self._durations = dict()
+        self._duration_smoothing = 0.3
+        # Number of consecutive frames each visualizer has been shed
+        self._shed_counts = dict()
+        self.shed_retry_interval = shed_retry_interval
+        # Canvas size (width, height) the run time estimates refer to
+        self._frame_size = None
+        self._shed = list()
     
-    def add(self, identifier: str, visualizer: object) -> None:
+    def add(
+            self, identifier: str, visualizer: object, priority: int = 0,
+            cache_layer: bool = False) -> None:
         """
         Adds the given visualizer to this pipeline.
 
@@ -46,6 +109,13 @@ class VisualizationPipeline(object):
             input parameters for this visualizer in the `visualize` call.
           visualizer: A visualizer must have an `apply` method, which takes the
             `viren2d.Painter` (used for drawing) and its additional parameters.
+          priority: If a frame budget is set, visualizers with the highest
+            priority will always be applied, whereas lower-priority ones
+            may be shed.
+          cache_layer: If True, the visualizer will render onto its own
+            (transparent) layer, which will be reused if the visualizer has
+            to be shed. Only the drawn region of the layer is blended onto
+            the frame.
         """
         if identifier in self._identifiers:
             raise KeyError(
@@ -58,6 +128,17 @@ class VisualizationPipeline(object):
 
         self._identifiers.add(identifier)
         self._visualizers.append((identifier, visualizer))
+        self._priorities[identifier] = priority
+        if cache_layer:
+            self._layer_painters[identifier] = viren2d.Painter()
+
+    @property
+    def shed_visualizers(self) -> List[str]:
+        """
+        Identifiers of the visualizers which have been shed (due to the frame
+        budget) during the most recent `visualize` call.
+        """
+        return list(self._shed)
     
     def visualize(
             self, image: np.ndarray,
@@ -65,7 +146,9 @@ class VisualizationPipeline(object):
         """
         Applies the configured visualization pipeline on the given image.
 
-        Returns the visualization result as RGB image.
+        Returns the visualization result as RGB image. If the buffer pool is
+        enabled, the result must be handed back via `release` once it is no
+        longer needed.
 
         Args:
           image: Input image.
@@ -76,9 +159,17 @@ class VisualizationPipeline(object):
         if image is None:
             return None
 
+        start_time = time.perf_counter()
+        self._shed = list()
         pyutils.tic('painter-setup')
-        self._painter.set_canvas_image(image)
+        self._set_canvas(image)
         pyutils.toc('painter-setup')
+        frame_size = (self._painter.width, self._painter.height)
+        if frame_size != self._frame_size:
+            # Run times depend on the resolution
+            self._durations.clear()
+            self._shed_counts.clear()
+            self._frame_size = frame_size
 
         # pyutils.tic('sanity-check')
         # Warn the user about potential typos
@@ -90,19 +181,188 @@ class VisualizationPipeline(object):
         # pyutils.toc('sanity-check')
 
         # Apply all configured visualizers
-        for identifier, visualizer in self._visualizers:
+        self._apply_sequential(visualizer_args, start_time)
+        if len(self._shed) > 0:
+            logging.debug(
+                f'Frame budget exceeded, shed visualizers: {self._shed}')
+
+        # Return the visualization result (RGBA) as RGB image
+        #res = np.array(self._painter.canvas.to_channels(3), copy=True)
+        canvas = np.asarray(self._painter.get_canvas(copy=False))
+        if self._buffer_pool is None:
+            res = np.array(canvas, copy=True)
+            return res[:, :, :3]
+
+        res = self._buffer_pool.acquire(
+            (canvas.shape[0], canvas.shape[1], 3))
+        np.copyto(res, canvas[:, :, :3])
+        return res
+
+    def _set_canvas(self, image: np.ndarray) -> None:
+        # Copy RGB images of the same resolution into the existing canvas,
+        # as `set_canvas_image` would allocate a new one
+        if isinstance(image, np.ndarray) and (image.dtype == np.uint8) and \
+                (image.ndim == 3) and (image.shape[2] == 3) and \
+                (self._frame_size == (image.shape[1], image.shape[0])):
+            canvas = np.asarray(self._painter.get_canvas(copy=False))
+            np.copyto(canvas[:, :, :3], image)
+            canvas[:, :, 3] = 255
+        else:
+            self._painter.set_canvas_image(image)
+
+    def _apply_visualizer(
+            self, painter: viren2d.Painter, identifier: str,
+            visualizer: object, visualizer_args: Dict[str, Any]) -> bool:
+        # Only the `apply` call is timed, i.e. excluding any layer setup
+        start_time = time.perf_counter()
+        if identifier in visualizer_args:
+            success = visualizer.apply(painter, visualizer_args[identifier])
+        else:
+            success = visualizer.apply(painter)
+        self._update_duration(identifier, time.perf_counter() - start_time)
+        if not success:
+            logging.warning(
+                f'Visualizer "{identifier}" could not be applied properly - check the previous log messages.')
+        return success
+
+    def _update_duration(self, identifier: str, duration: float) -> None:
+        self._shed_counts.pop(identifier, None)
+        previous = self._durations.get(identifier)
+        if previous is None:
+            self._durations[identifier] = duration
+        else:
+            self._durations[identifier] = previous + self._duration_smoothing * (
+                duration - previous)
+
+    def _is_sheddable(self, identifier: str) -> bool:
+        # Visualizers with the highest priority are never shed
+        return (self.frame_budget_ms is not None) and (
+            self._priorities[identifier] < max(self._priorities.values()))
+
+    def _render_layer(
+            self, identifier: str, visualizer: object,
+            visualizer_args: Dict[str, Any],
+            width: int, height: int) -> np.ndarray:
+        # Renders a single visualizer onto its transparent layer
+        painter = self._layer_painters[identifier]
+        if self._layer_sizes.get(identifier) == (width, height):
+            # Reuse the layer, i.e. clear its canvas in-place
+            np.asarray(painter.get_canvas(copy=False)).fill(0)
+        else:
+            painter.set_canvas_rgb(
+                width=width, height=height, color=viren2d.Color(0, 0, 0, 0))
+        self._apply_visualizer(painter, identifier, visualizer, visualizer_args)
+        self._layer_sizes[identifier] = (width, height)
+        return self._layer_view(identifier)
+
+    def _layer_view(self, identifier: str) -> np.ndarray:
+        # Shares the memory of the layer's canvas (no copy)
+        return np.asarray(
+            self._layer_painters[identifier].get_canvas(copy=False))
+
+    def _composite_layer(self, layer: np.ndarray) -> None:
+        # Only blend the bounding box of the drawn (non-transparent) region
+        alpha = layer[:, :, 3]
+        rows = np.flatnonzero(alpha.any(axis=1))
+        if rows.shape[0] == 0:
+            return
+        top, bottom = rows[0], rows[-1] + 1
+        cols = np.flatnonzero(alpha[top:bottom].any(axis=0))
+        left, right = cols[0], cols[-1] + 1
+        self._painter.draw_image(
+            image=np.ascontiguousarray(layer[top:bottom, left:right]),
+            position=viren2d.Vec2d(float(left), float(top)),
+            anchor=viren2d.Anchor.TopLeft, alpha=1.0)
+
+    def _composite_cached_layer(self, identifier: str) -> None:
+        # Draws the previous layer of a shed visualizer (if available)
+        size = (self._painter.width, self._painter.height)
+        if (identifier in self._layer_painters) and (
+                self._layer_sizes.get(identifier) == size):
+            self._composite_layer(self._layer_view(identifier))
+
+    def _shed_visualizer(self, identifier: str) -> None:
+        self._shed.append(identifier)
+        self._shed_counts[identifier] = self._shed_counts.get(identifier, 0) + 1
+        self._composite_cached_layer(identifier)
+
+    def _is_retry_due(self, identifier: str) -> bool:
+        # A visualizer which has been shed for too long gets a trial run.
+        # Its stale estimate is dropped, so the trial's measurement replaces
+        # it (instead of being smoothed).
+        if self._shed_counts.get(identifier, 0) < self.shed_retry_interval:
+            return False
+        self._durations.pop(identifier, None)
+        return True
+
+    def _apply_sequential(
+            self, visualizer_args: Dict[str, Any], start_time: float) -> None:
+        width, height = self._painter.width, self._painter.height
+        for idx, (identifier, visualizer) in enumerate(self._visualizers):
+            if self._is_sheddable(identifier):
+                # Keep enough time for the remaining visualizers which have
+                # a higher priority than the current one.
+                priority = self._priorities[identifier]
+                reserved = sum(
+                    self._durations.get(other, 0.0)
+                    for other, _ in self._visualizers[idx + 1:]
+                    if self._priorities[other] > priority)
+                expected = time.perf_counter() - start_time + reserved \
+                    + self._durations.get(identifier, 0.0)
+                if (expected * 1e3 > self.frame_budget_ms) and \
+                        not self._is_retry_due(identifier):
+                    self._shed_visualizer(identifier)
+                    continue
+
             pyutils.tic(identifier)
-            if identifier in visualizer_args:
-                success = visualizer.apply(
-                    self._painter, visualizer_args[identifier])
+            if identifier in self._layer_painters:
+                self._composite_layer(self._render_layer(
+                    identifier, visualizer, visualizer_args, width, height))
             else:
-                success = visualizer.apply(self._painter)
-            if not success:
-                logging.warning(
-                    f'Visualizer "{identifier}" could not be applied properly - check the previous log messages.')
+                self._apply_visualizer(
+                    self._painter, identifier, visualizer, visualizer_args)
             pyutils.toc(identifier)
 
-        # Return the visualization result (RGBA) as RGB image
-        #res = np.array(self._painter.canvas.to_channels(3), copy=True)
-        res = np.array(self._painter.canvas, copy=True)
-        return res[:, :, :3]
+    def release(self, result: np.ndarray) -> None:
+        """
+        Hands a visualization result back to the buffer pool, so it can be
+        reused for subsequent `visualize` calls. The result (or any view of
+        it, *e.g.* ``vis[:, :, ::-1]``) must not be accessed afterwards.
+        Results which are not released are not reused, but will still be
+        freed once they are no longer referenced.
+
+        Does nothing if the buffer pool is disabled.
+        """
+        if (self._buffer_pool is None) or (result is None):
+            return
+        self._buffer_pool.release(result)
+
+    @contextlib.contextmanager
+    def rendered(
+            self, image: np.ndarray,
+            visualizer_args: Dict[str, Any]) -> Iterator[np.ndarray]:
+        """
+        Context manager which applies `visualize` and automatically releases
+        the result when leaving the context.
+
+        >>> with pipeline.rendered(image, args) as vis:
+        >>>     cv2.imshow('Visualization', vis[:, :, ::-1])
+        """
+        res = self.visualize(image, visualizer_args)
+        try:
+            yield res
+        finally:
+            self.release(res)
+
+    @property
+    def buffer_pool_stats(self) -> Dict[str, int]:
+        """
+        Returns the statistics of the output buffer pool (see
+        :meth:`cvvis2d.buffers.BufferPool.stats`), or an empty dictionary
+        if the pool is disabled. These only cover the result arrays returned
+        by `visualize`, *i.e.* allocations of the painter's canvas and of
+        layer canvases (see `add`) are not counted.
+        """
+        if self._buffer_pool is None:
+            return dict()
+        return self._buffer_pool.stats()
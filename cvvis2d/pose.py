@@ -0,0 +1,179 @@
+import collections
+import numpy as np
+import viren2d
+from typing import List, Sequence, Tuple, Union
+
+
+# Limbs of the 17 COCO keypoints (nose, eyes, ears, shoulders, elbows,
+# wrists, hips, knees, ankles), using 0-based keypoint indices.
+COCO_SKELETON = [
+    (15, 13), (13, 11), (16, 14), (14, 12), (11, 12), (5, 11), (6, 12),
+    (5, 6), (5, 7), (6, 8), (7, 9), (8, 10), (1, 2), (0, 1), (0, 2),
+    (1, 3), (2, 4), (3, 5), (4, 6)]
+
+
+def _skeleton_chains(
+        edges: np.ndarray,
+        groups: Sequence[int]) -> List[Tuple[np.ndarray, np.ndarray, int]]:
+    """
+    Decomposes the skeleton into chains, *i.e.* paths of connected edges
+    which belong to the same (color) group, so that each chain can be drawn
+    as a single polyline.
+
+    Returns a list of ``tuple(vertices, edge_indices, group)``.
+    """
+    incident = collections.defaultdict(list)
+    for idx, (v1, v2) in enumerate(edges):
+        incident[v1].append(idx)
+        incident[v2].append(idx)
+
+    used = np.zeros((edges.shape[0],), dtype=bool)
+    chains = list()
+    for seed in range(edges.shape[0]):
+        if used[seed]:
+            continue
+        used[seed] = True
+        vertices = [edges[seed, 0], edges[seed, 1]]
+        edge_indices = [seed]
+        # Extend the chain at both ends
+        for at_end in (True, False):
+            while True:
+                vertex = vertices[-1] if at_end else vertices[0]
+                nxt = next((
+                    e for e in incident[vertex]
+                    if not used[e] and groups[e] == groups[seed]), None)
+                if nxt is None:
+                    break
+                used[nxt] = True
+                other = edges[nxt, 1] if edges[nxt, 0] == vertex else edges[nxt, 0]
+                if at_end:
+                    vertices.append(other)
+                    edge_indices.append(nxt)
+                else:
+                    vertices.insert(0, other)
+                    edge_indices.insert(0, nxt)
+        chains.append(
+            (np.array(vertices), np.array(edge_indices), groups[seed]))
+    return chains
+
+
+class SkeletonOverlay(object):
+    """
+    Draws keypoints and the connecting limbs of (multiple) skeletons, *e.g.*
+    human pose estimates.
+
+    The parameters for :meth:`apply` are either the keypoints as ``(N, K, 3)``
+    array, *i.e.* ``(x, y, confidence)`` of ``K`` keypoints for each of the
+    ``N`` skeletons, or a ``tuple(keypoints, ids)`` to provide an
+    (integer) identifier per skeleton, *e.g.* the track id. These are used to
+    select the color if no `limb_colors` are configured.
+
+    Keypoints with a confidence below `min_confidence` are considered
+    invisible, and only limbs between two visible keypoints will be drawn.
+    Visibility is evaluated for all skeletons at once. The skeleton is split
+    into chains of connected limbs, and each visible part of such a chain
+    becomes a polyline. All polylines are drawn via a single call, as are
+    all joints.
+
+    Args:
+      skeleton: List of limbs as ``tuple(keypoint_index, keypoint_index)``.
+        Defaults to the COCO keypoint skeleton.
+      limb_colors: If set, the color of each limb (*i.e.* same length as
+        `skeleton`). Otherwise, limbs will be colored by skeleton id.
+      min_confidence: Minimum confidence of a visible keypoint.
+      line_style: How to draw the limbs. Its color will be ignored, as
+        limbs are colored per limb or skeleton.
+      draw_joints: Whether to draw markers at the visible keypoints.
+      joint_style: How to draw the joints. Unless `joint_color` is valid,
+        the joint color will be set per skeleton.
+      joint_color: Color of the joints.
+    """
+    def __init__(self):
+        self.skeleton = COCO_SKELETON
+        self.limb_colors = None
+        self.min_confidence = 0.3
+        self.line_style = viren2d.LineStyle(
+            width=3, cap='round', join='round')
+        self.draw_joints = True
+        self.joint_style = viren2d.MarkerStyle(
+            marker='o', size=7, filled=True)
+        self.joint_color = viren2d.Color.Invalid
+
+    def apply(
+            self, painter: viren2d.Painter,
+            keypoints: Union[np.ndarray, Tuple[np.ndarray, Sequence[int]]]) -> bool:
+        if isinstance(keypoints, tuple):
+            keypoints, ids = keypoints
+        else:
+            ids = None
+        keypoints = np.asarray(keypoints, dtype=np.float64)
+        if keypoints.size == 0:
+            return True
+        if (keypoints.ndim != 3) or (keypoints.shape[2] < 3):
+            raise ValueError(
+                f'Keypoints must be provided as (N, K, 3) array, but got {keypoints.shape}.')
+        num_skeletons = keypoints.shape[0]
+        if ids is None:
+            ids = range(num_skeletons)
+        elif len(ids) != num_skeletons:
+            raise ValueError(
+                f'Number of skeleton ids ({len(ids)}) does not match the '
+                f'number of skeletons ({num_skeletons}).')
+        skeleton_colors = [viren2d.Color.from_object_id(int(i)) for i in ids]
+
+        # Visibility of all keypoints & limbs
+        visible = (keypoints[:, :, 2] >= self.min_confidence) & np.isfinite(
+            keypoints[:, :, :2]).all(axis=2)
+        edges = np.asarray(self.skeleton, dtype=np.int64).reshape(-1, 2)
+        limb_visible = visible[:, edges[:, 0]] & visible[:, edges[:, 1]]
+
+        if self.limb_colors is None:
+            groups = [0] * edges.shape[0]
+        else:
+            if len(self.limb_colors) != edges.shape[0]:
+                raise ValueError(
+                    f'Number of limb colors ({len(self.limb_colors)}) does '
+                    f'not match the number of limbs ({edges.shape[0]}).')
+            groups = list(range(edges.shape[0]))
+            # Limbs of the same color can be chained
+            for idx, color in enumerate(self.limb_colors):
+                for prev in range(idx):
+                    if self.limb_colors[prev] == color:
+                        groups[idx] = groups[prev]
+                        break
+
+        # Collect the polylines, i.e. runs of consecutive visible limbs
+        # along each chain, as tuple(points, color)
+        polylines = list()
+        for vertices, edge_indices, _ in _skeleton_chains(edges, groups):
+            chain_visible = limb_visible[:, edge_indices]
+            for sidx in np.flatnonzero(chain_visible.any(axis=1)):
+                steps = np.diff(np.concatenate(
+                    ([0], chain_visible[sidx].astype(np.int8), [0])))
+                starts = np.flatnonzero(steps == 1)
+                stops = np.flatnonzero(steps == -1)
+                color = skeleton_colors[sidx] if self.limb_colors is None \
+                    else self.limb_colors[edge_indices[0]]
+                for start, stop in zip(starts, stops):
+                    points = keypoints[sidx, vertices[start:stop + 1], :2]
+                    polylines.append((
+                        [viren2d.Vec2d(*pt) for pt in points.tolist()], color))
+
+        success = True
+        if len(polylines) > 0:
+            success = painter.draw_trajectories(
+                trajectories=polylines, line_style=self.line_style)
+
+        if self.draw_joints:
+            sidx, kidx = np.nonzero(visible)
+            if sidx.shape[0] > 0:
+                positions = keypoints[sidx, kidx, :2].tolist()
+                markers = [
+                    (viren2d.Vec2d(*pos), self.joint_color
+                     if self.joint_color.is_valid() else skeleton_colors[s])
+                    for pos, s in zip(positions, sidx.tolist())]
+                res = painter.draw_markers(
+                    markers=markers, marker_style=self.joint_style)
+                success = success and res
+
+        return success
@@ -0,0 +1,447 @@
+"""
+Compact recording & replay of the per-frame visualizer arguments.
+
+The arguments are stored in a binary log file, which is laid out as follows
+(all values are little-endian):
+
+* Header: magic ``CVV2DARG``, format version (uint32), reserved (uint32).
+* One record per frame, each starting at an 8-byte aligned offset. A record
+  starts with its total size (uint64) and frame number (int64), followed by
+  the number of entries (uint32) and the entries, *i.e.* the visualizer
+  identifier and its encoded arguments. Numpy arrays are stored
+  raw (8-byte aligned) and lists of :class:`~cvvis2d.detection.BoundingBox2d`
+  are stored column-wise (geometry, colors and each label as a column).
+* Frame index: frame numbers (int64), record offsets (uint64) and record
+  sizes (uint64), each stored as a contiguous array.
+* Footer: index offset (uint64), number of frames (uint64), magic
+  ``CVV2DIDX``.
+
+Upon replay, the file is memory-mapped and the index is used to look up
+(ranges of) frames without parsing the remaining records. Recorded arrays
+are returned as read-only views into the mapped file. If the footer is
+missing (*e.g.* because the recording process crashed), the index is
+rebuilt from the record headers.
+"""
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+import logging
+import struct
+import numpy as np
+import viren2d
+from cvvis2d.detection import BoundingBox2d
+from cvvis2d.pipeline import VisualizationPipeline
+
+
+_HEADER_MAGIC = b'CVV2DARG'
+_FOOTER_MAGIC = b'CVV2DIDX'
+_FORMAT_VERSION = 2
+_HEADER = struct.Struct('<8sII')
+_FOOTER = struct.Struct('<QQ8s')
+# Record size (incl. this header) & frame number
+_RECORD = struct.Struct('<Qq')
+_ALIGNMENT = 8
+
+_U8 = struct.Struct('<B')
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_U64 = struct.Struct('<Q')
+_F64 = struct.Struct('<d')
+
+# Type tags of the encoded values
+_TAG_NONE = 0
+_TAG_BOOL = 1
+_TAG_INT = 2
+_TAG_FLOAT = 3
+_TAG_STR = 4
+_TAG_LIST = 5
+_TAG_TUPLE = 6
+_TAG_NDARRAY = 7
+_TAG_BBOXES = 8
+
+
+def _padding(offset: int) -> int:
+    return (-offset) % _ALIGNMENT
+
+
+class _Encoder(object):
+    """Serializes a single frame record into a byte buffer."""
+    def __init__(self, record_offset: int):
+        # Absolute file offset of this record, needed to align array data
+        self._offset = record_offset
+        self.buffer = bytearray()
+
+    def _align(self) -> None:
+        self.buffer.extend(
+            b'\x00' * _padding(self._offset + len(self.buffer)))
+
+    def write_str(self, text: str) -> None:
+        data = text.encode('utf-8')
+        self.buffer.extend(_U32.pack(len(data)))
+        self.buffer.extend(data)
+
+    def write_array(self, array: np.ndarray) -> None:
+        array = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise TypeError('Cannot record numpy arrays of dtype object.')
+        self.write_str(array.dtype.str)
+        self.buffer.extend(_U8.pack(array.ndim))
+        for dim in array.shape:
+            self.buffer.extend(_U64.pack(dim))
+        self._align()
+        self.buffer.extend(array.tobytes())
+
+    def write_str_column(self, column: List[str]) -> None:
+        data = [text.encode('utf-8') for text in column]
+        offsets = np.zeros((len(data) + 1,), dtype=np.uint32)
+        offsets[1:] = np.cumsum([len(d) for d in data])
+        self.write_array(offsets)
+        self.buffer.extend(b''.join(data))
+
+    def write_bboxes(self, boxes: List[BoundingBox2d]) -> None:
+        self.buffer.extend(_U32.pack(len(boxes)))
+        self.write_array(np.array(
+            [(b.left, b.top, b.width, b.height) for b in boxes],
+            dtype=np.float64))
+        self.write_array(np.array(
+            [(b.color.red, b.color.green, b.color.blue, b.color.alpha)
+             for b in boxes], dtype=np.float32))
+        for attr in ['label_top', 'label_bottom', 'label_left', 'label_right']:
+            self.write_str_column(
+                ['\n'.join(getattr(b, attr)) for b in boxes])
+
+    def write_value(self, value: Any) -> None:
+        if value is None:
+            self.buffer.extend(_U8.pack(_TAG_NONE))
+        elif isinstance(value, (bool, np.bool_)):
+            self.buffer.extend(_U8.pack(_TAG_BOOL))
+            self.buffer.extend(_U8.pack(int(value)))
+        elif isinstance(value, (int, np.integer)):
+            self.buffer.extend(_U8.pack(_TAG_INT))
+            self.buffer.extend(_I64.pack(int(value)))
+        elif isinstance(value, (float, np.floating)):
+            self.buffer.extend(_U8.pack(_TAG_FLOAT))
+            self.buffer.extend(_F64.pack(float(value)))
+        elif isinstance(value, str):
+            self.buffer.extend(_U8.pack(_TAG_STR))
+            self.write_str(value)
+        elif isinstance(value, np.ndarray):
+            self.buffer.extend(_U8.pack(_TAG_NDARRAY))
+            self.write_array(value)
+        elif isinstance(value, (list, tuple)):
+            if (len(value) > 0) and all(
+                    isinstance(v, BoundingBox2d) for v in value):
+                self.buffer.extend(_U8.pack(_TAG_BBOXES))
+                self.write_bboxes(value)
+                return
+            self.buffer.extend(_U8.pack(
+                _TAG_TUPLE if isinstance(value, tuple) else _TAG_LIST))
+            self.buffer.extend(_U32.pack(len(value)))
+            for v in value:
+                self.write_value(v)
+        else:
+            raise TypeError(
+                f'Cannot record visualizer arguments of type {type(value)}.')
+
+    def write_record(self, visualizer_args: Dict[str, Any]) -> None:
+        self.buffer.extend(_U32.pack(len(visualizer_args)))
+        for identifier, value in visualizer_args.items():
+            self.write_str(identifier)
+            self.write_value(value)
+        self._align()
+
+
+class _Decoder(object):
+    """Deserializes a single frame record from the memory-mapped file."""
+    def __init__(self, data: np.ndarray, offset: int):
+        self._data = data
+        self._pos = offset
+
+    def _unpack(self, fmt: struct.Struct) -> Any:
+        value = fmt.unpack_from(self._data, self._pos)[0]
+        self._pos += fmt.size
+        return value
+
+    def _bytes(self, length: int) -> bytes:
+        data = self._data[self._pos:self._pos + length].tobytes()
+        self._pos += length
+        return data
+
+    def read_str(self) -> str:
+        return self._bytes(self._unpack(_U32)).decode('utf-8')
+
+    def read_array(self) -> np.ndarray:
+        dtype = np.dtype(self.read_str())
+        ndim = self._unpack(_U8)
+        shape = tuple(self._unpack(_U64) for _ in range(ndim))
+        self._pos += _padding(self._pos)
+        num_bytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        raw = self._data[self._pos:self._pos + num_bytes]
+        self._pos += num_bytes
+        return np.asarray(raw).view(dtype).reshape(shape)
+
+    def read_str_column(self) -> List[str]:
+        offsets = self.read_array()
+        blob = self._bytes(int(offsets[-1]))
+        return [
+            blob[offsets[i]:offsets[i + 1]].decode('utf-8')
+            for i in range(offsets.shape[0] - 1)]
+
+    def read_bboxes(self) -> List[BoundingBox2d]:
+        num_boxes = self._unpack(_U32)
+        geometry = self.read_array()
+        colors = self.read_array()
+        labels = [self.read_str_column() for _ in range(4)]
+        # Empty labels are restored as None (which renders identically)
+        labels = [[lbl.split('\n') if lbl else None for lbl in column]
+                  for column in labels]
+        return [
+            BoundingBox2d.from_ltwh(
+                *geometry[i].tolist(), viren2d.Color(*colors[i].tolist()),
+                labels[0][i], labels[1][i], labels[2][i], labels[3][i])
+            for i in range(num_boxes)]
+
+    def read_value(self) -> Any:
+        tag = self._unpack(_U8)
+        if tag == _TAG_NONE:
+            return None
+        elif tag == _TAG_BOOL:
+            return bool(self._unpack(_U8))
+        elif tag == _TAG_INT:
+            return self._unpack(_I64)
+        elif tag == _TAG_FLOAT:
+            return self._unpack(_F64)
+        elif tag == _TAG_STR:
+            return self.read_str()
+        elif tag == _TAG_NDARRAY:
+            return self.read_array()
+        elif tag == _TAG_BBOXES:
+            return self.read_bboxes()
+        elif tag in (_TAG_LIST, _TAG_TUPLE):
+            values = [self.read_value() for _ in range(self._unpack(_U32))]
+            return tuple(values) if tag == _TAG_TUPLE else values
+        raise ValueError(f'Invalid type tag {tag} in recorded arguments.')
+
+    def read_record(self) -> Dict[str, Any]:
+        num_entries = self._unpack(_U32)
+        args = dict()
+        for _ in range(num_entries):
+            identifier = self.read_str()
+            args[identifier] = self.read_value()
+        return args
+
+
+class ArgsRecorder(object):
+    """
+    Logs the per-frame `visualizer_args` of a
+    :class:`~cvvis2d.pipeline.VisualizationPipeline` to a compact binary
+    file, which can be replayed via :class:`ArgsReplay`.
+
+    Supported argument types are None, bool, int, float, str, numpy arrays,
+    lists of :class:`~cvvis2d.detection.BoundingBox2d`, as well as (nested)
+    lists and tuples of these.
+
+    Each record carries its size and frame number, so a log can still be
+    replayed if the recorder was not closed properly (*e.g.* after a crash).
+    Use :meth:`flush` to limit the amount of buffered (and thus possibly
+    lost) frames.
+
+    >>> with ArgsRecorder('session.cvv') as recorder:
+    >>>     for frame_number, image in enumerate(stream):
+    >>>         args = {'frame-label': ..., 'bbox2d': ...}
+    >>>         recorder.record(frame_number, args)
+    >>>         vis = pipeline.visualize(image, args)
+
+    Args:
+      filename: Output file, will be overwritten if it exists.
+    """
+    def __init__(self, filename: str):
+        self._file = open(filename, 'wb')
+        self._file.write(_HEADER.pack(_HEADER_MAGIC, _FORMAT_VERSION, 0))
+        self._offset = _HEADER.size
+        self._frame_numbers = list()
+        self._offsets = list()
+        self._sizes = list()
+
+    def __enter__(self) -> 'ArgsRecorder':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._frame_numbers)
+
+    def record(self, frame_number: int, visualizer_args: Dict[str, Any]) -> None:
+        """
+        Appends the visualizer arguments of the given frame. Frame numbers
+        must be strictly increasing.
+        """
+        if self._file is None:
+            raise RuntimeError('Recorder has already been closed.')
+        frame_number = int(frame_number)
+        if (len(self._frame_numbers) > 0) and (
+                frame_number <= self._frame_numbers[-1]):
+            raise ValueError(
+                f'Frame numbers must be strictly increasing, but got '
+                f'{frame_number} after {self._frame_numbers[-1]}.')
+
+        encoder = _Encoder(self._offset + _RECORD.size)
+        encoder.write_record(visualizer_args)
+        size = _RECORD.size + len(encoder.buffer)
+        self._file.write(_RECORD.pack(size, frame_number))
+        self._file.write(encoder.buffer)
+        self._frame_numbers.append(frame_number)
+        self._offsets.append(self._offset)
+        self._sizes.append(size)
+        self._offset += size
+
+    def flush(self) -> None:
+        """
+        Flushes the recorded frames to the file, so they can be recovered
+        even if the recording process is killed.
+        """
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        """Writes the frame index and closes the file."""
+        if self._file is None:
+            return
+        self._file.write(np.array(self._frame_numbers, dtype='<i8').tobytes())
+        self._file.write(np.array(self._offsets, dtype='<u8').tobytes())
+        self._file.write(np.array(self._sizes, dtype='<u8').tobytes())
+        self._file.write(_FOOTER.pack(
+            self._offset, len(self._frame_numbers), _FOOTER_MAGIC))
+        self._file.close()
+        self._file = None
+
+
+class ArgsReplay(object):
+    """
+    Provides random access to visualizer arguments which have been logged
+    via :class:`ArgsRecorder`.
+
+    The log file is memory-mapped, so only the index and the requested
+    records will be read. Recorded numpy arrays are returned as read-only
+    views into the mapped file.
+
+    >>> replay = ArgsReplay('session.cvv')
+    >>> for frame_number, vis in replay.render(pipeline, load_frame, 100, 200):
+    >>>     cv2.imshow('Replay', vis[:, :, ::-1])
+
+    Args:
+      filename: Log file written by :class:`ArgsRecorder`.
+    """
+    def __init__(self, filename: str):
+        self._data = np.memmap(filename, dtype=np.uint8, mode='r')
+        if (self._data.shape[0] < _HEADER.size):
+            raise ValueError(f'"{filename}" is not a valid argument log.')
+        magic, version, _ = _HEADER.unpack_from(self._data, 0)
+        if magic != _HEADER_MAGIC:
+            raise ValueError(f'"{filename}" is not a valid argument log.')
+        if version != _FORMAT_VERSION:
+            raise ValueError(
+                f'Unsupported argument log version {version} in "{filename}".')
+        magic = None
+        if self._data.shape[0] >= _HEADER.size + _FOOTER.size:
+            index_offset, num_frames, magic = _FOOTER.unpack_from(
+                self._data, self._data.shape[0] - _FOOTER.size)
+        if magic != _FOOTER_MAGIC:
+            self._rebuild_index()
+            logging.warning(
+                f'Argument log "{filename}" has no frame index (was the '
+                f'recorder closed properly?), recovered {len(self)} frames.')
+            return
+
+        def _index_column(column: int, dtype: str) -> np.ndarray:
+            start = index_offset + column * num_frames * 8
+            return np.asarray(
+                self._data[start:start + num_frames * 8]).view(dtype)
+
+        self._frame_numbers = _index_column(0, '<i8')
+        self._offsets = _index_column(1, '<u8')
+        self._sizes = _index_column(2, '<u8')
+
+    def _rebuild_index(self) -> None:
+        # Scans the record headers, stopping at the first incomplete or
+        # invalid record.
+        frame_numbers, offsets, sizes = list(), list(), list()
+        offset = _HEADER.size
+        file_size = self._data.shape[0]
+        while offset + _RECORD.size <= file_size:
+            size, frame_number = _RECORD.unpack_from(self._data, offset)
+            if (size <= _RECORD.size) or (size % _ALIGNMENT != 0) or (
+                    offset + size > file_size) or (
+                    (len(frame_numbers) > 0) and
+                    (frame_number <= frame_numbers[-1])):
+                break
+            frame_numbers.append(frame_number)
+            offsets.append(offset)
+            sizes.append(size)
+            offset += size
+        self._frame_numbers = np.array(frame_numbers, dtype=np.int64)
+        self._offsets = np.array(offsets, dtype=np.uint64)
+        self._sizes = np.array(sizes, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return self._frame_numbers.shape[0]
+
+    def __contains__(self, frame_number: int) -> bool:
+        idx = np.searchsorted(self._frame_numbers, frame_number)
+        return (idx < len(self)) and (self._frame_numbers[idx] == frame_number)
+
+    def __getitem__(self, frame_number: int) -> Dict[str, Any]:
+        """Returns the visualizer arguments of the given frame."""
+        idx = int(np.searchsorted(self._frame_numbers, frame_number))
+        if (idx >= len(self)) or (self._frame_numbers[idx] != frame_number):
+            raise KeyError(f'Frame #{frame_number} has not been recorded.')
+        return self._decode(idx)
+
+    @property
+    def frame_numbers(self) -> np.ndarray:
+        """Sorted frame numbers of all recorded frames."""
+        return self._frame_numbers
+
+    def _decode(self, idx: int) -> Dict[str, Any]:
+        return _Decoder(
+            self._data, int(self._offsets[idx]) + _RECORD.size).read_record()
+
+    def frames(
+            self, first: int = None,
+            last: int = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Yields ``tuple(frame_number, visualizer_args)`` for all recorded
+        frames within ``[first, last)``. If not set, the range extends to
+        the first/last recorded frame.
+        """
+        start = 0 if first is None else int(
+            np.searchsorted(self._frame_numbers, first, side='left'))
+        stop = len(self) if last is None else int(
+            np.searchsorted(self._frame_numbers, last, side='left'))
+        for idx in range(start, stop):
+            yield int(self._frame_numbers[idx]), self._decode(idx)
+
+    def render(
+            self, pipeline: VisualizationPipeline,
+            load_image: Callable[[int], np.ndarray],
+            first: int = None,
+            last: int = None) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Re-renders the recorded frames within ``[first, last)``.
+
+        Yields ``tuple(frame_number, visualization)``, see
+        :meth:`~cvvis2d.pipeline.VisualizationPipeline.visualize`. The
+        visualization is only valid until the next iteration, as it will
+        be released to the pipeline's buffer pool (if enabled) afterwards.
+        Copy it if you need to keep it.
+
+        Args:
+          pipeline: The visualization pipeline, configured with the same
+            visualizer identifiers as used during recording.
+          load_image: Callable which returns the image for the given frame
+            number.
+          first: First frame number to render (inclusive).
+          last: Last frame number (exclusive).
+        """
+        for frame_number, args in self.frames(first, last):
+            with pipeline.rendered(load_image(frame_number), args) as vis:
+                yield frame_number, vis
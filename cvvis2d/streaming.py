@@ -0,0 +1,277 @@
+from typing import Callable, Dict
+import http.server
+import io
+import logging
+import queue
+import socketserver
+import threading
+import urllib.parse
+import numpy as np
+
+
+def _jpeg_encoder(quality: int) -> Callable[[np.ndarray], bytes]:
+    """
+    Returns a function which encodes an RGB image as JPEG, using either
+    OpenCV or Pillow (whichever is available).
+    """
+    try:
+        import cv2
+
+        def _encode(image: np.ndarray) -> bytes:
+            # OpenCV expects BGR
+            success, data = cv2.imencode(
+                '.jpg', image[:, :, 2::-1],
+                [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not success:
+                raise RuntimeError('JPEG encoding failed.')
+            return data.tobytes()
+        return _encode
+    except ImportError:
+        pass
+
+    try:
+        from PIL import Image
+
+        def _encode(image: np.ndarray) -> bytes:
+            buffer = io.BytesIO()
+            Image.fromarray(np.ascontiguousarray(image[:, :, :3])).save(
+                buffer, format='JPEG', quality=quality)
+            return buffer.getvalue()
+        return _encode
+    except ImportError:
+        pass
+
+    raise RuntimeError(
+        'MJPEG streaming requires a JPEG encoder, install either '
+        '`opencv-python` or `Pillow`.')
+
+
+class _Client(object):
+    """A connected viewer, which consumes frames from its bounded queue."""
+    def __init__(self, preview: bool, queue_size: int):
+        self.preview = preview
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.num_dropped = 0
+
+    def offer(self, data: bytes) -> None:
+        # If the client cannot keep up, drop its oldest pending frame
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            try:
+                self.queue.get_nowait()
+                self.num_dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(data)
+            except queue.Full:
+                self.num_dropped += 1
+
+
+class _StreamRequestHandler(http.server.BaseHTTPRequestHandler):
+    _BOUNDARY = 'cvvis2dframe'
+    _INDEX = (
+        '<html><head><title>cvvis2d</title></head><body style="margin:0">'
+        '<img src="{:s}" style="max-width:100%"></body></html>')
+
+    def do_GET(self):
+        sink = self.server.sink
+        path = urllib.parse.urlparse(self.path).path
+        if path in ('/', '/index.html', '/preview.html'):
+            content = self._INDEX.format(
+                '/preview' if path == '/preview.html' else '/stream').encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        elif path in ('/stream', '/preview'):
+            client = sink._register(preview=(path == '/preview'))
+            try:
+                self.send_response(200)
+                self.send_header(
+                    'Content-Type',
+                    f'multipart/x-mixed-replace; boundary={self._BOUNDARY}')
+                self.send_header('Cache-Control', 'no-cache, private')
+                self.send_header('Pragma', 'no-cache')
+                self.end_headers()
+                while True:
+                    data = client.queue.get()
+                    if data is None:
+                        break
+                    self.wfile.write(
+                        f'--{self._BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                        f'Content-Length: {len(data)}\r\n\r\n'.encode('ascii'))
+                    self.wfile.write(data)
+                    self.wfile.write(b'\r\n')
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                sink._unregister(client)
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        logging.debug(f'MJPEG sink {self.address_string()}: {format % args}')
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class MJPEGStreamSink(object):
+    """
+    Serves the visualization results as MJPEG stream via HTTP, so they can
+    be watched in a browser.
+
+    Each frame passed to :meth:`publish` is encoded only once and the
+    resulting bytes are shared by all connected clients. Every client has a
+    bounded queue, *i.e.* slow clients will skip frames instead of delaying
+    the others. Downscaled frames (for preview clients) are only encoded if
+    such a client is connected.
+
+    Endpoints:
+
+    * ``/stream``: Full resolution MJPEG stream.
+    * ``/preview``: Downscaled MJPEG stream.
+    * ``/`` and ``/preview.html``: Minimal viewer pages.
+
+    >>> with MJPEGStreamSink(port=8080) as sink:
+    >>>     while True:
+    >>>         with pipeline.rendered(next_image(), args) as vis:
+    >>>             sink.publish(vis)
+
+    As :meth:`publish` encodes the frame synchronously, the result can be
+    released right away (see
+    :meth:`cvvis2d.pipeline.VisualizationPipeline.rendered`).
+
+    Requires either OpenCV or Pillow for JPEG encoding.
+
+    Args:
+      host: Address to listen on. Defaults to localhost, use ``'0.0.0.0'``
+        to allow clients from your local network.
+      port: Port to listen on.
+      quality: JPEG quality (0-100).
+      preview_step: Subsampling step of the preview stream, *e.g.* 4
+        reduces the width & height to a quarter.
+      queue_size: Maximum number of pending frames per client.
+    """
+    def __init__(
+            self, host: str = '127.0.0.1', port: int = 8080,
+            quality: int = 80, preview_step: int = 4, queue_size: int = 2):
+        if preview_step < 1:
+            raise ValueError(
+                f'Preview step must be >= 1, but got {preview_step}.')
+        if queue_size < 1:
+            raise ValueError(
+                f'Client queue size must be >= 1, but got {queue_size}.')
+        self._encode = _jpeg_encoder(quality)
+        self.host = host
+        self.port = port
+        self.preview_step = preview_step
+        self.queue_size = queue_size
+        self._clients = list()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        # Statistics
+        self._num_published = 0
+        self._num_encoded = 0
+        self._num_dropped = 0
+
+    def __enter__(self) -> 'MJPEGStreamSink':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}/stream'
+
+    def start(self) -> None:
+        """Starts the HTTP server in a background thread."""
+        if self._server is not None:
+            return
+        self._server = _ThreadingHTTPServer(
+            (self.host, self.port), _StreamRequestHandler)
+        self._server.sink = self
+        # Update the port in case it was chosen by the OS (port 0)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='cvvis2d-mjpeg',
+            daemon=True)
+        self._thread.start()
+        logging.info(f'MJPEG stream available at {self.url}')
+
+    def stop(self) -> None:
+        """Disconnects all clients and stops the HTTP server."""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        with self._lock:
+            for client in self._clients:
+                client.offer(None)
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+    def _register(self, preview: bool) -> _Client:
+        client = _Client(preview, self.queue_size)
+        with self._lock:
+            self._clients.append(client)
+        return client
+
+    def _unregister(self, client: _Client) -> None:
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+            self._num_dropped += client.num_dropped
+
+    def publish(self, image: np.ndarray) -> None:
+        """
+        Encodes the given RGB(A) image and sends it to all connected clients.
+
+        Encoding happens synchronously, so the caller may reuse (or release)
+        the image as soon as this call returns.
+        """
+        if image is None:
+            return
+        with self._lock:
+            clients = list(self._clients)
+        self._num_published += 1
+        if len(clients) == 0:
+            return
+
+        full, preview = None, None
+        for client in clients:
+            if client.preview:
+                if preview is None:
+                    preview = self._encode(
+                        image[::self.preview_step, ::self.preview_step, :3])
+                    self._num_encoded += 1
+                client.offer(preview)
+            else:
+                if full is None:
+                    full = self._encode(image[:, :, :3])
+                    self._num_encoded += 1
+                client.offer(full)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the streaming statistics, *i.e.* the number of connected
+        clients, published frames, JPEG encodings and frames dropped for
+        slow clients.
+        """
+        with self._lock:
+            return {
+                'clients': len(self._clients),
+                'published': self._num_published,
+                'encoded': self._num_encoded,
+                'dropped': self._num_dropped + sum(
+                    c.num_dropped for c in self._clients)
+            }
@@ -0,0 +1,66 @@
+import time
+import numpy as np
+import cvvis2d
+
+
+class _SleepingVisualizer(object):
+    """Simulates a visualizer by sleeping for the given run times (in ms)."""
+    def __init__(self, first_ms: float, steady_ms: float):
+        self.first_ms = first_ms
+        self.steady_ms = steady_ms
+        self.num_applied = 0
+
+    def apply(self, painter, *args) -> bool:
+        self.num_applied += 1
+        ms = self.first_ms if self.num_applied == 1 else self.steady_ms
+        time.sleep(ms / 1e3)
+        return True
+
+
+def check_slow_first_frame(
+        cache_layer: bool, num_frames: int = 50, budget_ms: float = 30,
+        retry_interval: int = 10):
+    """
+    A low-priority visualizer which is slow only upon its first call (*e.g.*
+    due to loading fonts) must be retried and then applied again on every
+    frame, as the frame budget easily covers its steady run time.
+    """
+    pipeline = cvvis2d.VisualizationPipeline(
+        frame_budget_ms=budget_ms, shed_retry_interval=retry_interval)
+    high = _SleepingVisualizer(5, 5)
+    low = _SleepingVisualizer(50, 1)
+    pipeline.add('high', high, priority=1)
+    pipeline.add('low', low, priority=0, cache_layer=cache_layer)
+
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    num_shed = 0
+    for _ in range(num_frames):
+        pipeline.visualize(image, dict())
+        num_shed += len(pipeline.shed_visualizers)
+
+    print(f'cache_layer={cache_layer}: low-priority visualizer applied on '
+          f'{low.num_applied}/{num_frames} frames, shed on {num_shed}.')
+    if high.num_applied != num_frames:
+        raise RuntimeError('The high-priority visualizer must never be shed.')
+    # Only the frames until the first retry may be shed
+    if num_shed > retry_interval:
+        raise RuntimeError(
+            'The low-priority visualizer has not been retried properly.')
+
+
+def check_resolution_change():
+    """Run time estimates must be reset if the resolution changes."""
+    pipeline = cvvis2d.VisualizationPipeline(frame_budget_ms=30)
+    pipeline.add('high', _SleepingVisualizer(5, 5), priority=1)
+    low = _SleepingVisualizer(50, 1)
+    pipeline.add('low', low, priority=0)
+    pipeline.visualize(np.zeros((480, 640, 3), dtype=np.uint8), dict())
+    pipeline.visualize(np.zeros((240, 320, 3), dtype=np.uint8), dict())
+    if low.num_applied != 2:
+        raise RuntimeError('Run time estimates have not been reset.')
+
+
+if __name__ == '__main__':
+    check_slow_first_frame(cache_layer=False)
+    check_slow_first_frame(cache_layer=True)
+    check_resolution_change()
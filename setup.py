@@ -22,6 +22,8 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/snototter/viren2d-visualizers",
     packages=setuptools.find_packages(),
+    entry_points={
+        'console_scripts': ['cvvis2d=cvvis2d.cli:main']},
     install_requires=[
         'numpy',
         'viren2d @ git+https://github.com/snototter/viren2d.git'],